@@ -1,9 +1,18 @@
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import psycopg2
 from psycopg2.extras import execute_values
-import os, re, html, time
+import os, re, io, csv, html, time
+import atexit, functools, hashlib, shelve, threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional; the stdlib parser also accepts bytes
+    from json import loads as json_loads
 
 load_dotenv()
 # Database configuration
@@ -22,8 +31,28 @@ DB_CONFIG = {
 }
 
 CROSSREF_API_URL = "https://api.crossref.org/works"
-BATCH_SIZE = 5  # Insert every 5 records to balance performance and safety
-RATE_LIMIT = 1  # Seconds to wait between API requests
+BATCH_SIZE = 1000  # Flush every 1000 records; Postgres batch gains plateau around 1k-10k rows
+COMMIT_EVERY = 10000  # Commit after this many flushed records (one fsync per commit)
+CSV_CHUNK_SIZE = 1024  # CSV rows read and looked up per chunk
+RATE_LIMIT = 50  # Max CrossRef requests per second across all workers (polite pool)
+MAX_WORKERS = 8  # Concurrent CrossRef lookups
+DOI_BATCH_SIZE = 20  # DOIs per CrossRef filter=doi:... request
+CROSSREF_MAILTO = os.getenv('CROSSREF_MAILTO')  # Contact address that qualifies requests for the polite pool
+CROSSREF_CACHE = os.getenv('CROSSREF_CACHE', 'crossref_cache')  # On-disk cache of CrossRef lookups
+
+# Shared HTTP session: keep-alive connection pool, gzip responses, and retry with backoff
+# on rate limiting / server errors (honours Retry-After)
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=2, status_forcelist=[429, 500, 502, 503, 504],
+                      raise_on_status=False),
+))
+SESSION.headers.update({
+    'Accept-Encoding': 'gzip',
+    'User-Agent': f"oceanpub/1.0 (mailto:{CROSSREF_MAILTO})" if CROSSREF_MAILTO else "oceanpub/1.0",
+})
 
 # Mapping of Chinese columns to English
 COLUMN_MAPPING = {
@@ -43,14 +72,47 @@ COLUMN_MAPPING = {
     '海洋學門資料庫': 'ODB'
 }
 
+# Column order of the publications table, used to serialize records for COPY / execute_values
+PUB_COLUMNS = ('DOI', 'title', 'firstAuthor', 'authors', 'publisher', 'journal', 'published_year',
+               'published_date', 'abstract', 'URL', 'affiliationTW', 'correspondingTW', 'vessels')
+# Abstracts are stored raw by transform_data and stripped of markup / the "Abstract" heading
+# by Postgres as they are inserted
+ABSTRACT_CLEAN_SQL = "regexp_replace({}, '<[^>]*>|Abstract', '', 'g')"
+# Ship / instrument-center / database usage flags (0/1 in the CSV), packed into the `vessels`
+# INT column with FLAG_COLUMNS[i] at bit i: OR1=bit0, OR2=bit1, ... ODB=bit11.
+# Query e.g. NOR1 with `WHERE (vessels & (1 << 4)) <> 0`, or use the publications_flags view.
+FLAG_COLUMNS = ('OR1', 'OR2', 'OR3', 'OR5', 'NOR1', 'NOR2', 'NOR3', 'LEGEND', 'MIC1', 'MIC2', 'MIC3', 'ODB')
+
+# Regex patterns used by the title/abstract helpers, compiled once at import
+_RE_TAG = re.compile(r'<.*?>')
+_RE_TAG_PCT = re.compile(r'<.*?>|\%')
+_RE_WS = re.compile(r'\s+')
+_RE_HYPHEN = re.compile(r'\u2010|\u2013|\u2014|\s*(-)\s*')
+_RE_HYPHEN_ESC = re.compile(r'\\u2010|\u2013|\u2014|\s*(-)\s*')
+_RE_QUOTES_ESC = re.compile(r'\\u2018|\u2019|\u201C|\u201D|')
+_RE_ENYE_ESC = re.compile(r'\\u00f1')
+_RE_ENYE_UPPER_ESC = re.compile(r'\\u00d1')
+_RE_PUNCT = re.compile(r'[^\w\s]|[,\.]|[。,\.\?]$')
+_RE_REF_QUOTES = re.compile(r"[‘’“”']")
+_RE_YEAR_PAREN = re.compile(r'[（\(]\d{4}[^）\)]*[）\)][.,]?\s*(.*?)(?:[。.]|,(?![^(]*\))\s*[A-Z])')
+_RE_YEAR = re.compile(r'\d{4}[.,]?\s*(.*?)(?:[。.]|,(?![^(]*\))\s*[A-Z])')
+# DOI cited in a reference; stops at whitespace, quotes, commas, brackets and full-width punctuation
+_RE_DOI = re.compile(r'(10\.\d{4,9}/[^\s"<>,\[\]（）。，；]+)')
+
+# Curly single/double quotes to plain quotes, applied in one str.translate pass
+_QUOTE_TRANSLATION = str.maketrans({
+    '\u2018': "'", '\u2019': "'",  # Left & Right single quotes
+    '\u201C': '"', '\u201D': '"',  # Left & Right double quotes
+})
+
 def clean_title(text):
-    text = re.sub(r'<.*?>|\%', '', text)  # Remove HTML-like tags
-    text = re.sub(r'\s+', ' ', text)  # Remove HTML-like tags
-    text = re.sub(r'\\u2010|\u2013|\u2014|\s*(-)\s*', '', text)  # Convert Unicode hyphen to normal hyphen
-    text = re.sub(r'\\u2018|\u2019|\u201C|\u201D|', '', text)    # Convert Unicode single or double quote
-    text = re.sub(r'\\u00f1', 'ñ', text)  # Convert Unicode 'ñ'
-    text = re.sub(r'\\u00d1', 'Ñ', text)  # Convert Unicode 'Ñ'
-    text = re.sub(r'[^\w\s]|[,\.]|[。,\.\?]$', '', text)  # Remove special characters except spaces
+    text = _RE_TAG_PCT.sub('', text)  # Remove HTML-like tags
+    text = _RE_WS.sub(' ', text)  # Remove HTML-like tags
+    text = _RE_HYPHEN_ESC.sub('', text)  # Convert Unicode hyphen to normal hyphen
+    text = _RE_QUOTES_ESC.sub('', text)    # Convert Unicode single or double quote
+    text = _RE_ENYE_ESC.sub('ñ', text)  # Convert Unicode 'ñ'
+    text = _RE_ENYE_UPPER_ESC.sub('Ñ', text)  # Convert Unicode 'Ñ'
+    text = _RE_PUNCT.sub('', text)  # Remove special characters except spaces
     return text.lower().strip()
 
 
@@ -65,18 +127,14 @@ def format_title_for_db(title: str) -> str:
         return ""
     
     # Remove HTML tags
-    title = re.sub(r'<.*?>', '', title)
-    title = re.sub(r'\s+', ' ', title)
+    title = _RE_TAG.sub('', title)
+    title = _RE_WS.sub(' ', title)
 
     # Convert Unicode hyphen to regular hyphen
-    title = re.sub(r'\u2010|\u2013|\u2014|\s*(-)\s*', "-", title)
-    
-    # Convert special characters like La Ni\u00f1a → La Niña
-    title = title.replace("\u00f1", "ñ").replace("\u00d1", "Ñ")
+    title = _RE_HYPHEN.sub("-", title)
     
     # Convert Unicode single and double quotes
-    title = title.replace("\u2018", "'").replace("\u2019", "'")  # Left & Right single quotes
-    title = title.replace("\u201C", '"').replace("\u201D", '"')  # Left & Right double quotes
+    title = title.translate(_QUOTE_TRANSLATION)
 
     # Decode any escaped HTML entities (e.g., &amp;, &lt;)
     title = html.unescape(title)
@@ -92,83 +150,189 @@ def extract_title(paper_info):
     - English period (.)
     - Comma (,) when followed by a capitalized word and not inside parentheses
     """
-    paper_info = re.sub(r"[‘’“”']", '', paper_info)
+    paper_info = _RE_REF_QUOTES.sub('', paper_info)
  
     # Case 1: Year inside parentheses (any content after year until closing parenthesis is ignored)
-    match = re.search(r'[（\(]\d{4}[^）\)]*[）\)][.,]?\s*(.*?)(?:[。.]|,(?![^(]*\))\s*[A-Z])', paper_info)
+    match = _RE_YEAR_PAREN.search(paper_info)
     if match:
         return match.group(1).strip()
 
     # Case 2: Year not inside parentheses
-    match = re.search(r'\d{4}[.,]?\s*(.*?)(?:[。.]|,(?![^(]*\))\s*[A-Z])', paper_info)
+    match = _RE_YEAR.search(paper_info)
     if match:
         return match.group(1).strip()
 
     return paper_info.strip()  # Default case: return full text if nothing matches
 
-def fetch_crossref_info(paper_title, max_retries=3):
-    """Fetch paper details from CrossRef API with rate limiting and retries."""
+def strip_doi(doi):
+    """Lowercase a matched DOI and trim trailing punctuation, including an unbalanced closing parenthesis."""
+    doi = doi.rstrip('.;:')
+    while doi.endswith(')') and doi.count(')') > doi.count('('):
+        doi = doi[:-1].rstrip('.;:')
+    return doi.lower()
+
+def extract_dois(paper_infos):
+    """Column-wise DOI cited in each paper reference (NaN if none), normalized by strip_doi."""
+    return paper_infos.str.extract(_RE_DOI, expand=False).map(strip_doi, na_action='ignore')
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls evenly so at most `rate` start per second."""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+crossref_limiter = RateLimiter(RATE_LIMIT)
+
+_crossref_shelf = None
+_crossref_lock = threading.Lock()  # shelve is not safe for concurrent access
+
+def crossref_cache():
+    """Open the on-disk CrossRef cache once and keep it open until exit."""
+    global _crossref_shelf
+    if _crossref_shelf is None:
+        _crossref_shelf = shelve.open(CROSSREF_CACHE)
+        atexit.register(_crossref_shelf.close)
+    return _crossref_shelf
+
+def get_cached_crossref(key):
+    """Return the cached CrossRef entry for key, or None if it was never fetched."""
+    with _crossref_lock:
+        return crossref_cache().get(key)
+
+def crossref_cache_key(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def cache_crossref_item(key, item, payload):
+    """Store a CrossRef lookup result with its fetch time and API message version."""
+    with _crossref_lock:
+        crossref_cache()[key] = {
+            'item': item,
+            'fetched_at': datetime.now(timezone.utc).isoformat(),
+            'message_version': payload.get('message-version'),
+        }
+
+def fetch_crossref_info(paper_title):
+    """
+    Fetch paper details from CrossRef API with rate limiting; retries are handled by SESSION.
+    Results (including "no match") are cached on disk keyed by the normalized title,
+    so reruns skip the API for titles already looked up.
+    """
+    key = crossref_cache_key(clean_title(paper_title))
+    cached = get_cached_crossref(key)
+    if cached is not None:
+        return cached['item']
+
     params = {'query.title': paper_title, 'rows': 5}
-    
-    for attempt in range(max_retries):
-        time.sleep(RATE_LIMIT)  # Wait to respect API rate limits
-        
-        response = requests.get(CROSSREF_API_URL, params=params)
-        
-        if response.status_code == 200:
-            items = response.json().get('message', {}).get('items', [])
-            for item in items:
-                if clean_title(paper_title) == clean_title(item.get('title', [''])[0]):
-                    return item
-            print(f"No exact match found for: {paper_title}")
-            return None
-        
-        elif response.status_code == 503:  # Service Unavailable (Rate Limited)
-            print(f"CrossRef API rate limit exceeded, retrying... ({attempt + 1}/{max_retries})")
-            time.sleep(30)  # Wait longer before retrying
-        
-        else:
-            print(f"CrossRef API request failed for: {paper_title} (Status {response.status_code})")
-            return None
-    
-    print(f"Failed to fetch '{paper_title}' after {max_retries} attempts. Skipping.")
+    if CROSSREF_MAILTO:
+        params['mailto'] = CROSSREF_MAILTO
+
+    crossref_limiter.wait()  # Shared across workers to respect API rate limits
+    try:
+        response = SESSION.get(CROSSREF_API_URL, params=params, timeout=15)
+    except requests.RequestException as e:
+        print(f"CrossRef API request failed for: {paper_title} ({e}). Skipping.")
+        return None
+
+    if response.status_code != 200:
+        print(f"CrossRef API request failed for: {paper_title} (Status {response.status_code})")
+        return None
+
+    payload = json_loads(response.content)
+    items = payload.get('message', {}).get('items', [])
+    for item in items:
+        if clean_title(paper_title) == clean_title(item.get('title', [''])[0]):
+            cache_crossref_item(key, item, payload)
+            return item
+    print(f"No exact match found for: {paper_title}")
+    cache_crossref_item(key, None, payload)
     return None
 
 
+def fetch_crossref_by_dois(dois):
+    """
+    Fetch CrossRef records for references that already cite a DOI, DOI_BATCH_SIZE DOIs per request.
+    Returns {doi (lowercase): item}; DOIs unknown to CrossRef are left out so callers can fall back
+    to a title search. Results are cached on disk like fetch_crossref_info.
+    """
+    found = {}
+    pending = []
+    for doi in dict.fromkeys(dois):
+        cached = get_cached_crossref(crossref_cache_key(f"doi:{doi}"))
+        if cached is None:
+            pending.append(doi)
+        elif cached['item']:
+            found[doi] = cached['item']
+
+    for start in range(0, len(pending), DOI_BATCH_SIZE):
+        chunk = pending[start:start + DOI_BATCH_SIZE]
+        params = {'filter': ','.join(f"doi:{doi}" for doi in chunk), 'rows': len(chunk)}
+        if CROSSREF_MAILTO:
+            params['mailto'] = CROSSREF_MAILTO
+
+        crossref_limiter.wait()
+        try:
+            response = SESSION.get(CROSSREF_API_URL, params=params, timeout=15)
+        except requests.RequestException as e:
+            print(f"CrossRef DOI lookup failed for {len(chunk)} DOIs ({e}). Falling back to titles.")
+            continue
+        if response.status_code != 200:
+            print(f"CrossRef DOI lookup failed for {len(chunk)} DOIs (Status {response.status_code})")
+            continue
+
+        payload = json_loads(response.content)
+        items = {item.get('DOI', '').lower(): item for item in payload.get('message', {}).get('items', [])}
+        for doi in chunk:
+            item = items.get(doi)
+            cache_crossref_item(crossref_cache_key(f"doi:{doi}"), item, payload)
+            if item:
+                found[doi] = item
+    print(f"Resolved {len(found)} papers by DOI.")
+    return found
+
+
 def transform_data(row, crossref_data):
+    """Build a publications record from CrossRef data and a preprocessed CSV row (English column keys)."""
     published_date_parts = crossref_data.get('published-print', {}).get('date-parts', [['Unknown']])[0]
     if 'Unknown' in published_date_parts:
         published_date_parts = crossref_data.get('published-online', {}).get('date-parts', [['Unknown']])[0]
  
     published_date = "-".join(map(str, published_date_parts)) if 'Unknown' not in published_date_parts else 'Unknown'
-    print("Title: ", crossref_data.get('title', [''])[0], " which published_date is: ", published_date)  
+    title = crossref_data.get('title', [''])[0]
+    doi = crossref_data.get('DOI', '')
+    print("Title: ", title, " which published_date is: ", published_date)  
     published_year = int(published_date_parts[0]) if published_date_parts[0] != 'Unknown' else None
+
+    # Format each author once; firstAuthor reuses the first name instead of re-reading the list
+    author_names = [f"{a.get('given', '')} {a.get('family', '')}".strip() for a in crossref_data.get('author') or []]
      
     data = {
-        'DOI': crossref_data.get('DOI', ''),
-        'title': format_title_for_db(crossref_data.get('title', [''])[0]),
-        'firstAuthor': crossref_data.get('author', [{}])[0].get('given', '') + ' ' + crossref_data.get('author', [{}])[0].get('family', ''),
-        'authors': ', '.join([f"{a.get('given', '')} {a.get('family', '')}" for a in crossref_data.get('author', [])]),
+        'DOI': doi,
+        'title': format_title_for_db(title),
+        'firstAuthor': author_names[0] if author_names else '',
+        'authors': ', '.join(author_names),
         'publisher': crossref_data.get('publisher', ''),
         'journal': crossref_data.get('short-container-title', [''])[0],
         'published_year': published_year,
         'published_date': published_date,
-        'abstract': re.sub(r'<.*?>|Abstract', '', crossref_data.get('abstract', '')),
-        'URL': f"https://doi.org/{crossref_data.get('DOI', '')}"
+        'abstract': crossref_data.get('abstract', ''),  # Cleaned on insert, see ABSTRACT_CLEAN_SQL
+        'URL': f"https://doi.org/{doi}",
+        'affiliationTW': row.get('affiliationTW', ''),
+        'correspondingTW': row.get('correspondingTW', ''),
+        'vessels': int(row.get('vessels', 0)),  # Packed column-wise in process_csv
     }
     
-    for zh_col, en_col in COLUMN_MAPPING.items():
-        if zh_col in row:
-            data[en_col] = bool(row[zh_col])
-    
-    data['affiliationTW'] = row.get('學校單位', '') if pd.notna(row.get('學校單位')) else ''
-    data['correspondingTW'] = row.get('姓名', '') if pd.notna(row.get('姓名')) else ''
-    
     return data
 
-def create_table():
-    conn = psycopg2.connect(**DB_CONFIG)
-    cursor = conn.cursor()
+def create_table(cursor):
     create_table_query = """
     CREATE TABLE IF NOT EXISTS publications (
         DOI TEXT PRIMARY KEY,
@@ -183,94 +347,212 @@ def create_table():
         URL TEXT,
         affiliationTW TEXT,
         correspondingTW TEXT,
-        OR1 BOOLEAN,
-        OR2 BOOLEAN,
-        OR3 BOOLEAN,
-        OR5 BOOLEAN,
-        NOR1 BOOLEAN,
-        NOR2 BOOLEAN,
-        NOR3 BOOLEAN,
-        LEGEND BOOLEAN,
-        MIC1 BOOLEAN,
-        MIC2 BOOLEAN,
-        MIC3 BOOLEAN,
-        ODB BOOLEAN
+        vessels INT NOT NULL DEFAULT 0
     );
     """
     cursor.execute(create_table_query)
-    conn.commit()
-    cursor.close()
-    conn.close()
 
-def doi_exists(doi):
-    """ Check if DOI already exists in the database """
-    conn = psycopg2.connect(**DB_CONFIG)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM publications WHERE DOI = %s", (doi,))
-    exists = cursor.fetchone() is not None
-    cursor.close()
-    conn.close()
-    return exists
-
-def insert_into_postgres(records):
-    """Insert records into PostgreSQL in batches."""
-    if not records:
+    # Migrate tables created with one BOOLEAN column per flag: pack them into vessels, then drop them.
+    # Each ALTER/UPDATE only runs when needed, so an up-to-date table is never locked here.
+    cursor.execute("""
+    SELECT column_name FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = 'publications' AND column_name = ANY(%s)
+    """, (['vessels'] + [col.lower() for col in FLAG_COLUMNS],))
+    existing_cols = {row[0] for row in cursor.fetchall()}
+    if 'vessels' not in existing_cols:
+        cursor.execute("ALTER TABLE publications ADD COLUMN vessels INT NOT NULL DEFAULT 0")
+    legacy = [(bit, col) for bit, col in enumerate(FLAG_COLUMNS) if col.lower() in existing_cols]
+    if legacy:
+        packed = ' | '.join(f"(COALESCE({col}, false)::int << {bit})" for bit, col in legacy)
+        cursor.execute(f"UPDATE publications SET vessels = {packed}")
+        cursor.execute("ALTER TABLE publications " + ', '.join(f"DROP COLUMN {col}" for _, col in legacy))
+
+    # One boolean column per flag, matching the pre-bitmask table layout (e.g. for CSV exports)
+    cursor.execute("SELECT to_regclass('publications_flags')")
+    if cursor.fetchone()[0] is not None:
         return
+    flag_list = ',\n        '.join(f"(vessels & {1 << bit}) <> 0 AS {col}" for bit, col in enumerate(FLAG_COLUMNS))
+    cursor.execute(f"""
+    CREATE VIEW publications_flags AS
+    SELECT DOI, title, firstAuthor, authors, publisher, journal, published_year,
+           published_date, abstract, URL, affiliationTW, correspondingTW,
+        {flag_list}
+    FROM publications;
+    """)
+
+def insert_into_postgres(cursor, records, page_size=1000):
+    """Insert records into PostgreSQL in batches of page_size rows per statement. Returns the set of inserted DOIs."""
+    if not records:
+        return set()
 
-    conn = psycopg2.connect(**DB_CONFIG)
-    cursor = conn.cursor()
-    
     query = """
     INSERT INTO publications (DOI, title, firstAuthor, authors, publisher, journal, published_year,
-                              published_date, abstract, URL, affiliationTW, correspondingTW,
-                              OR1, OR2, OR3, OR5, NOR1, NOR2, NOR3, LEGEND, MIC1, MIC2, MIC3, ODB)
+                              published_date, abstract, URL, affiliationTW, correspondingTW, vessels)
     VALUES %s
-    ON CONFLICT (DOI) DO NOTHING;
+    ON CONFLICT (DOI) DO NOTHING
+    RETURNING DOI;
     """
     
-    values = [[record[col] for col in records[0].keys()] for record in records]
-    execute_values(cursor, query, values)
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-def process_csv(file_path, BATCH_SIZE=5):
-    create_table()
-    df = pd.read_csv(file_path)
-    batch_data = []
-    
-    for _, row in df.iterrows():
-        paper_info = row['論文']
-        paper_title = extract_title(paper_info)
-        if not paper_title or "http" in paper_title:
-            print(f"Skipping: Paper title no content or contains URL '{paper_title}'")
-            continue
-        crossref_data = fetch_crossref_info(paper_title)
-        
-        if crossref_data:
-            doi = crossref_data.get('DOI')
-            if not doi:
-                print(f"Warning: Skipping paper '{paper_title}' due to missing DOI.")
-                continue
-            if doi_exists(doi):
-                print(f"Warning: Skipping duplicate DOI '{doi}' already in database.")
-                continue
-
-            record = transform_data(row, crossref_data)
-            insert_into_postgres([record])  # Insert immediately
-
-            # Also store in batch in case of later processing
-            batch_data.append(record)
-
-            # Batch insert every N records
-            if len(batch_data) >= BATCH_SIZE:
-                insert_into_postgres(batch_data)
-                batch_data = []
-
-    # Final insert for remaining data
-    if batch_data:
-        insert_into_postgres(batch_data)
+    # Fixed column order: does not depend on each record's key order, missing keys become NULL
+    values = [tuple(record.get(col) for col in PUB_COLUMNS) for record in records]
+    template = "(" + ", ".join(ABSTRACT_CLEAN_SQL.format("%s") if col == 'abstract' else "%s"
+                               for col in PUB_COLUMNS) + ")"
+    inserted = execute_values(cursor, query, values, template=template, page_size=page_size, fetch=True)
+    return {row[0] for row in inserted}
+
+def prepare_staging(cursor):
+    """
+    Create the session's COPY staging table and PREPARE the statement that merges it into
+    publications, so each flush runs EXECUTE instead of re-parsing and re-planning the merge.
+    """
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS publications_stage (LIKE publications) ON COMMIT DELETE ROWS")
+    columns = ', '.join(PUB_COLUMNS)
+    select_list = ', '.join(ABSTRACT_CLEAN_SQL.format(col) if col == 'abstract' else col for col in PUB_COLUMNS)
+    cursor.execute(f"""
+    PREPARE merge_publications_stage AS
+    INSERT INTO publications ({columns})
+    SELECT {select_list} FROM publications_stage
+    ON CONFLICT (DOI) DO NOTHING
+    RETURNING DOI
+    """)
+
+def copy_into_postgres(cursor, records):
+    """
+    Bulk load records with COPY FROM STDIN.
+    Rows are staged in a temp table first so that duplicate DOIs are skipped by ON CONFLICT.
+    Requires prepare_staging() to have run on the same connection. Returns the set of inserted DOIs.
+    """
+    if not records:
+        return set()
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerows([record.get(col) for col in PUB_COLUMNS] for record in records)
+    buf.seek(0)
+    columns = ', '.join(PUB_COLUMNS)
+
+    # None is written as an unquoted empty field (NULL); text columns keep empty strings instead
+    cursor.copy_expert(f"""
+    COPY publications_stage ({columns})
+    FROM STDIN WITH (FORMAT CSV, FORCE_NOT_NULL (DOI, title, firstAuthor, authors, publisher, journal,
+                                                 published_date, abstract, URL, affiliationTW, correspondingTW))
+    """, buf)
+    cursor.execute("EXECUTE merge_publications_stage")
+    inserted = {row[0] for row in cursor.fetchall()}
+    cursor.execute("TRUNCATE publications_stage")
+    return inserted
+
+def prepare_rows(df):
+    """
+    Column-wise preprocessing of a CSV chunk: extract titles and DOIs, drop unusable rows,
+    pack flags and normalize text. Returns the remaining rows as dicts with English keys.
+    """
+    df['paper_title'] = df['論文'].map(extract_title, na_action='ignore')
+    keep = df['paper_title'].str.len().gt(0) & ~df['paper_title'].str.contains('http', na=False)
+    for paper_title in df.loc[~keep, 'paper_title']:
+        print(f"Skipping: Paper title no content or contains URL '{paper_title}'")
+    df = df[keep].rename(columns=COLUMN_MAPPING)
+    df['vessels'] = 0
+    for bit, col in enumerate(FLAG_COLUMNS):
+        if col in df.columns:
+            df['vessels'] += df[col].fillna(0).astype(bool).astype(int) * (1 << bit)
+    text_cols = [col for col in ('affiliationTW', 'correspondingTW') if col in df.columns]
+    df[text_cols] = df[text_cols].fillna('')
+    df['ref_doi'] = extract_dois(df['論文'])
+    return df.to_dict('records')
+
+def lookup_crossref(doi_future, row):
+    """CrossRef record for a row: the batched DOI hit if any, else a title search."""
+    return doi_future.result().get(row['ref_doi']) or fetch_crossref_info(row['paper_title'])
+
+def lookup_csv(file_path, executor):
+    """
+    Read the CSV in CSV_CHUNK_SIZE chunks and yield (row, crossref_data) in file order.
+    Lookups for the next chunk are submitted before the current one is yielded, so CrossRef
+    requests overlap with the caller's database writes while memory stays bounded to two chunks.
+    """
+    pending = None
+    # Read references as text so a chunk with no references is not typed as a float column
+    for chunk in pd.read_csv(file_path, chunksize=CSV_CHUNK_SIZE, dtype={'論文': str}):
+        rows = prepare_rows(chunk)
+        # References citing a DOI are resolved in batches on the pool (submitted ahead of the row
+        # lookups that wait on it), so the caller's writes never block on DOI round-trips
+        doi_future = executor.submit(
+            fetch_crossref_by_dois, [row['ref_doi'] for row in rows if isinstance(row['ref_doi'], str)])
+        results = executor.map(functools.partial(lookup_crossref, doi_future), rows)
+        if pending:
+            yield from zip(*pending)
+        pending = (rows, results)
+    if pending:
+        yield from zip(*pending)
+
+def process_csv(file_path, BATCH_SIZE=BATCH_SIZE, use_copy=True):
+    """
+    Look up every paper in the CSV on CrossRef and load the results into publications.
+    All statements share one connection. Schema setup is committed before the lookups start;
+    loaded rows are committed every COMMIT_EVERY rows and once at the end, and an error rolls
+    back the uncommitted part.
+    """
+    flush = copy_into_postgres if use_copy else insert_into_postgres
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.set_session(autocommit=False)
+    try:
+        with conn, conn.cursor() as cursor:
+            create_table(cursor)
+            if use_copy:
+                prepare_staging(cursor)
+            # Release any schema locks before the long CrossRef lookups start
+            conn.commit()
+            # DOIs already in the table are skipped by ON CONFLICT at insert time; only
+            # duplicates within this run are filtered here
+            seen = set()
+
+            def flush_batch(batch):
+                inserted = flush(cursor, batch)
+                for record in batch:
+                    if record['DOI'] not in inserted:
+                        print(f"Warning: Skipping duplicate DOI '{record['DOI']}' already in database.")
+
+            batch_data = []
+            uncommitted = 0
+            # Look up CrossRef concurrently; results come back in row order
+            executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+            try:
+                for row, crossref_data in lookup_csv(file_path, executor):
+                    if not crossref_data:
+                        continue
+                    doi = crossref_data.get('DOI')
+                    if not doi:
+                        print(f"Warning: Skipping paper '{row['paper_title']}' due to missing DOI.")
+                        continue
+                    if doi in seen:
+                        print(f"Warning: Skipping duplicate DOI '{doi}' already in this CSV.")
+                        continue
+
+                    batch_data.append(transform_data(row, crossref_data))
+                    seen.add(doi)
+
+                    # Batch insert every N records
+                    if len(batch_data) >= BATCH_SIZE:
+                        flush_batch(batch_data)
+                        uncommitted += len(batch_data)
+                        batch_data = []
+
+                    # Periodic commit for crash safety on long runs
+                    if uncommitted >= COMMIT_EVERY:
+                        conn.commit()
+                        uncommitted = 0
+            except BaseException:
+                # Fail fast: cancel lookups queued for the next chunk instead of waiting them out
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            executor.shutdown()
+
+            # Final insert for remaining data; leaving the `with conn` block commits
+            if batch_data:
+                flush_batch(batch_data)
+    finally:
+        conn.close()
 
 
 if __name__ == "__main__":